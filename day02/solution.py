@@ -67,6 +67,47 @@ def part2(lines):
     return sum(PART2_SCORES[line.strip()] for line in lines)
 
 
+# Both parts as flat tables indexed by 3 * opponent + response, e.g. "B Z" is 5.
+PART1_TABLE = [line_result(f"{left} {right}") for left in "ABC" for right in "XYZ"]
+PART2_TABLE = [PART2_SCORES[f"{left} {right}"] for left in "ABC" for right in "XYZ"]
+
+RECORD_SIZE = len(b"A X\n")
+
+
+def batch_scores(data, chunk_records=1 << 22):
+    """
+    Score a whole strategy guide, given as raw bytes (or an mmap), for both
+    parts at once. Every line is a fixed width "A X\\n" record, so we can count
+    how many times each of the 9 possible lines appears and multiply through.
+
+    >>> batch_scores(b"A Y\\nB X\\nC Z\\n")
+    (15, 12)
+    >>> batch_scores(b"A Y\\nB X\\nC Z")
+    (15, 12)
+    """
+    import numpy as np
+
+    counts = np.zeros(9, dtype=np.int64)
+    # The last line might not have a newline, so the final record can be a
+    # byte short.
+    records = (len(data) + 1) // RECORD_SIZE
+
+    for start in range(0, records, chunk_records):
+        count = min(chunk_records, records - start)
+        full = count if (start + count) * RECORD_SIZE <= len(data) else count - 1
+
+        chunk = np.frombuffer(data, dtype=np.uint8, count=full * RECORD_SIZE, offset=start * RECORD_SIZE)
+        chunk = chunk.reshape(-1, RECORD_SIZE)
+        index = (chunk[:, 0] - ord("A")) * 3 + (chunk[:, 2] - ord("X"))
+        counts += np.bincount(index, minlength=9)
+
+        if full < count:
+            last = (start + full) * RECORD_SIZE
+            counts[(data[last] - ord("A")) * 3 + (data[last + 2] - ord("X"))] += 1
+
+    return int(counts @ PART1_TABLE), int(counts @ PART2_TABLE)
+
+
 def main():
     with open("input") as f:
         lines = f.readlines()
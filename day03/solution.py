@@ -1,5 +1,6 @@
 import functools
 import operator
+import string
 
 
 def character_score(c):
@@ -32,12 +33,58 @@ def part2(lines):
     return sum(character_score(per_three_lines(three_lines)) for three_lines in chunk(lines, 3))
 
 
+# Each item type gets the bit matching its priority, so a rucksack is just an
+# int and the single common item's priority is the highest set bit.
+ITEM_BITS = {c: 1 << character_score(c) for c in string.ascii_letters}
+
+
+def item_mask(items):
+    return functools.reduce(operator.or_, map(ITEM_BITS.__getitem__, items), 0)
+
+
+def both_parts(lines):
+    """
+    Both parts in a single pass over any iterable of lines, so a file can be
+    streamed rather than read into memory.
+
+    >>> both_parts([
+    ...     "vJrwpWtwJgWrhcsFMMfFFhFp",
+    ...     "jqHRNqRjqzjGDLGLrsFMfFZSrLrFZsSL",
+    ...     "PmmdzqPrVvPwwTWBwg",
+    ...     "wMqvLMZHhHMvwLHjbvcjnnSBnvTQFn",
+    ...     "ttgJtRGJQctTZtZT",
+    ...     "CrZsJsPPZsGzwwsLwLmpwMDw",
+    ... ])
+    (157, 70)
+    >>> both_parts(["vJrwpWtwJgWrhcsFMMfFFhFp", "", "jqHRNqRjqzjGDLGLrsFMfFZSrLrFZsSL", "PmmdzqPrVvPwwTWBwg", ""])
+    (96, 18)
+    """
+    part1 = 0
+    part2 = 0
+    group = -1
+
+    lines = (line.strip() for line in lines)
+
+    for i, line in enumerate(line for line in lines if line):
+        half = len(line) // 2
+        left, right = item_mask(line[:half]), item_mask(line[half:])
+
+        part1 += (left & right).bit_length() - 1
+        group &= left | right
+
+        if i % 3 == 2:
+            part2 += group.bit_length() - 1
+            group = -1
+
+    return part1, part2
+
+
 def main():
     with open("input") as f:
-        lines = list(f.readlines())
+        part1, part2 = both_parts(f)
 
-    print("Part 1:  ", part1(lines))
-    print("Part 2:  ", part2(lines))
+    print("Part 1:  ", part1)
+    print("Part 2:  ", part2)
 
 
 if __name__ == "__main__":
@@ -1,42 +1,165 @@
-from collections import deque
-import copy
-
-
 def chunk(iter, size):
     return (iter[i:min(i + size, len(iter))] for i in range(0, len(iter), size))
 
 
-def apply_operation(state, operation):
-    count, source, destination = operation
-    for __ in range(0, count):
-        state[destination].append(state[source].pop())
+class Stacks:
+    """
+    Crate stacks that move whole blocks of crates with list slicing rather
+    than one crate at a time.
 
+    Snapshots share their stacks with the original, and a stack is only
+    copied the first time either side moves something on or off it.
 
-def apply_buffered_operation(state, operation):
-    count, source, destination = operation
+    >>> stacks = Stacks({1: ["Z", "N"], 2: ["M", "C", "D"], 3: ["P"]})
+    >>> copy = stacks.snapshot()
+    >>> stacks.move(3, 2, 1)
+    >>> stacks.tops(), copy.tops()
+    ('MP', 'NDP')
+    >>> copy.move(3, 2, 1, keep_order=True)
+    >>> stacks.tops(), copy.tops()
+    ('MP', 'DP')
+    >>> stacks.stack(1), copy.stack(1)
+    (['Z', 'N', 'D', 'C', 'M'], ['Z', 'N', 'M', 'C', 'D'])
+    >>> stacks.move(2, 1, 1)
+    >>> stacks.stack(1)
+    ['Z', 'N', 'D', 'C', 'M']
+    >>> stacks.move(2, 3, 1)
+    Traceback (most recent call last):
+    ...
+    IndexError: can't move 2 crates off stack 3
+    """
+
+    def __init__(self, stacks, owned=None):
+        self._stacks = stacks
+        self._owned = set(stacks) if owned is None else owned
+
+    def __repr__(self):
+        return f"Stacks({self._stacks})"
+
+    def snapshot(self):
+        # Once shared, neither side owns any stack until it copies it.
+        self._owned = set()
+        return Stacks(dict(self._stacks), set())
+
+    def indices(self):
+        return list(self._stacks)
 
-    buffer = deque()
+    def stack(self, index):
+        return self._stacks[index]
 
-    for __ in range(0, count):
-        buffer.append(state[source].pop())
+    def _writable(self, index):
+        if index not in self._owned:
+            self._stacks[index] = list(self._stacks[index])
+            self._owned.add(index)
 
-    buffer.reverse()
+        return self._stacks[index]
 
-    state[destination].extend(buffer)
+    def move(self, count, source, destination, keep_order=False):
+        # Moving crates onto the stack they came from leaves it as it was,
+        # whichever crane does it.
+        if count == 0 or source == destination:
+            return
+
+        if count > len(self._stacks[source]):
+            raise IndexError(f"can't move {count} crates off stack {source}")
+
+        source = self._writable(source)
+        destination = self._writable(destination)
+
+        crates = source[-count:]
+        del source[-count:]
+
+        if not keep_order:
+            # The CrateMover 9000 moves them one at a time, so they end up reversed.
+            crates.reverse()
+
+        destination.extend(crates)
+
+    def tops(self):
+        return "".join(stack[-1] for stack in self._stacks.values() if stack)
+
+
+def apply_operation(state, operation):
+    count, source, destination = operation
+    state.move(count, source, destination)
+
+
+def apply_buffered_operation(state, operation):
+    count, source, destination = operation
+    state.move(count, source, destination, keep_order=True)
 
 
 def part1(state, operations):
     for operation in operations:
         apply_operation(state, operation)
 
-    return "".join(stack[-1] for stack in state.values())
+    return state.tops()
 
 
 def part2(state, operations):
     for operation in operations:
         apply_buffered_operation(state, operation)
 
-    return "".join(stack[-1] for stack in state.values())
+    return state.tops()
+
+
+def final_tops(state, operations, keep_order=False):
+    """
+    Work out the tops without moving any crates. Each final top is a position
+    (stack, depth from the top), and walking the operations backwards tells
+    us where that position was before each one, until we reach the original
+    stacks.
+
+    >>> stacks = Stacks({1: ["Z", "N"], 2: ["M", "C", "D"], 3: ["P"]})
+    >>> operations = [[1, 2, 1], [3, 1, 3], [2, 2, 1], [1, 1, 2]]
+    >>> final_tops(stacks, operations)
+    'CMZ'
+    >>> final_tops(stacks, operations, keep_order=True)
+    'MCD'
+    >>> final_tops(Stacks({1: ["A", "B", "C"], 2: ["D"]}), [[2, 1, 1]])
+    'CD'
+    >>> final_tops(stacks, [[2, 3, 1]])
+    Traceback (most recent call last):
+    ...
+    IndexError: can't move 2 crates off stack 3
+    """
+    heights = {index: len(state.stack(index)) for index in state.indices()}
+
+    for count, source, destination in operations:
+        if source == destination:
+            continue
+
+        if count > heights[source]:
+            raise IndexError(f"can't move {count} crates off stack {source}")
+
+        heights[source] -= count
+        heights[destination] += count
+
+    tops = []
+
+    for index, height in heights.items():
+        if height == 0:
+            continue
+
+        stack, depth = index, 0
+
+        for count, source, destination in reversed(operations):
+            if source == destination:
+                continue
+
+            if stack == destination:
+                if depth < count:
+                    stack = source
+                    if not keep_order:
+                        depth = count - 1 - depth
+                else:
+                    depth -= count
+            elif stack == source:
+                depth += count
+
+        tops.append(state.stack(stack)[-1 - depth])
+
+    return "".join(tops)
 
 
 def parse_container_string(container_string):
@@ -58,7 +181,7 @@ def parse_file(contents):
     for stack_row in stack_rows:
         for stack_index, container in enumerate(stack_row):
             if container is not None:
-                stacks.setdefault(stack_index + 1, deque())
+                stacks.setdefault(stack_index + 1, [])
                 stacks[stack_index + 1].append(container)
 
     parsed_operations = []
@@ -68,7 +191,7 @@ def parse_file(contents):
 
         parsed_operations.append([int(n) for n in (count, source, destination)])
 
-    return stacks, parsed_operations
+    return Stacks(stacks), parsed_operations
 
 
 def main():
@@ -77,8 +200,8 @@ def main():
 
     state, operations = parse_file(contents)
 
-    print("Part 1:  ", part1(copy.deepcopy(state), operations))
-    print("Part 2:  ", part2(copy.deepcopy(state), operations))
+    print("Part 1:  ", part1(state.snapshot(), operations))
+    print("Part 2:  ", part2(state.snapshot(), operations))
 
 
 
@@ -2,23 +2,73 @@ import collections
 
 
 class Node:
+    """
+    A file (with a size) or a directory (with children). Directories cache
+    their total size, and adding anything underneath clears the cached totals
+    on the way back up to the root.
+
+    >>> root = Node("", None, [Node("a", 10), Node("b", None, [Node("c", 5)])])
+    >>> root.size
+    15
+    >>> root.child("b").add(Node("d", 7))
+    Node(d, 7, None)
+    >>> root.size, root.child("b").size
+    (22, 12)
+    """
+
+    __slots__ = ("name", "parent", "children", "_size", "_total")
+
     def __init__(self, name=None, size=None, children=None):
         self.name = name
+        self.parent = None
         self._size = size
-        self.children = children
+        self._total = None
+        self.children = None
+
+        if children is not None:
+            self.children = {}
+
+            for child in children:
+                self.add(child)
 
     def __repr__(self):
-        return f"Node({self.name}, {self.size}, {self.children})"
+        children = list(self.children.values()) if self.children is not None else None
+        return f"Node({self.name}, {self.size}, {children})"
 
     @property
     def size(self):
-        return self._size or sum(c.size for c in self.children)
+        if self.children is None:
+            return self._size
+
+        if self._total is None:
+            self._total = sum(c.size for c in self.children.values())
+
+        return self._total
+
+    def child(self, name):
+        return self.children[name]
+
+    def add(self, child):
+        if existing := self.children.get(child.name):
+            return existing
+
+        child.parent = self
+        self.children[child.name] = child
+
+        # If a directory's total isn't cached then neither are any of its
+        # parents', so we can stop there.
+        node = self
+        while node is not None and node._total is not None:
+            node._total = None
+            node = node.parent
+
+        return child
 
     def walk(self):
         yield self
 
         if self.children:
-            for child in self.children:
+            for child in self.children.values():
                 yield from child.walk()
 
 
@@ -38,34 +88,200 @@ def parse_tree(lines):
                     case ("cd", ".."):
                         pwd.pop()
                     case ("cd", name):
-                        pwd.append([c for c in pwd[-1].children if c.name == name][0])
+                        pwd.append(pwd[-1].child(name))
                     case ("ls", _):
                         pass
                 pass
             case ("dir", name):
-                pwd[-1].children.append(Node(name=name, children=[]))
+                pwd[-1].add(Node(name=name, children=[]))
             case (size, name):
-                pwd[-1].children.append(Node(name=name, size=int(size)))
+                pwd[-1].add(Node(name=name, size=int(size)))
 
     return root
 
 
+DISK_SIZE = 70000000
+SPACE_REQUIRED = 30000000
+SMALL_DIRECTORY = 100000
+
+
 def part1(tree):
-    return sum(n.size for n in tree.walk() if n.size < 100000 and n.children)
+    return sum(n.size for n in tree.walk() if n.size < SMALL_DIRECTORY and n.children)
 
 
-def part2(tree):
-    disk_size = 70000000
-    space_used = tree.size
-    space_required = 30000000
+def space_to_free(space_used):
+    return (DISK_SIZE - space_used - SPACE_REQUIRED) * -1
 
-    space_to_free = (disk_size - space_used - space_required) * -1
 
-    directory_sizes = sorted([n.size for n in tree.walk() if n.children and n.size > space_to_free])
+def part2(tree):
+    to_free = space_to_free(tree.size)
+
+    directory_sizes = sorted([n.size for n in tree.walk() if n.children and n.size > to_free])
 
     return directory_sizes[0]
 
 
+def stream_directory_sizes(lines):
+    """
+    Yield the size of every directory as soon as we leave it, keeping only
+    the running totals of the directories we're currently inside. The root is
+    always last. Like part1 and part2, empty directories are left out. This
+    assumes each directory is only listed once.
+
+    >>> list(stream_directory_sizes([
+    ...     "$ cd /", "$ ls", "dir a", "10 b.txt",
+    ...     "$ cd a", "$ ls", "dir e", "dir g", "5 f",
+    ...     "$ cd e", "$ ls", "3 i", "$ cd ..",
+    ...     "$ cd g", "$ ls",
+    ... ]))
+    [3, 8, 18]
+    """
+    totals = [0]
+    listed = [False]
+
+    def leave():
+        size = totals.pop()
+        empty = not listed.pop()
+
+        # The root is always yielded, even if it's empty.
+        if totals:
+            totals[-1] += size
+            if empty:
+                return None
+
+        return size
+
+    for line in lines:
+        match line.split():
+            case ("$", "cd", "/"):
+                while len(totals) > 1:
+                    if (size := leave()) is not None:
+                        yield size
+            case ("$", "cd", ".."):
+                if (size := leave()) is not None:
+                    yield size
+            case ("$", "cd", _):
+                totals.append(0)
+                listed.append(False)
+            case ("$", "ls"):
+                pass
+            case ("dir", _):
+                listed[-1] = True
+            case (size, _):
+                totals[-1] += int(size)
+                listed[-1] = True
+
+    while totals:
+        if (size := leave()) is not None:
+            yield size
+
+
+def streamed_parts(lines):
+    part1 = 0
+    # Part 2 can't pick a directory until it knows how big the root is, which
+    # comes last, so it still needs every directory's size (but no files).
+    directory_sizes = []
+
+    for size in stream_directory_sizes(lines):
+        if size < SMALL_DIRECTORY:
+            part1 += size
+        directory_sizes.append(size)
+
+    to_free = space_to_free(directory_sizes[-1])
+
+    return part1, min(size for size in directory_sizes if size > to_free)
+
+
+class FlatTree:
+    """
+    A tree flattened into parallel arrays in pre-order, so every node comes
+    after its parent. Directory totals are summed up the tree one depth at a
+    time, and then the sizes of directories with anything in them (as in
+    part1 and part2) are kept sorted, with running sums, so size questions
+    are just binary searches.
+
+    >>> root = Node("", None, [Node("a", 10), Node("b", None, [Node("c", 5)]), Node("d", None, [])])
+    >>> flat = FlatTree.from_tree(root)
+    >>> flat.directory_sizes.tolist()
+    [5, 15]
+    >>> flat.smallest_at_least(1), flat.smallest_at_least(6), flat.smallest_at_least(16)
+    (5, 15, None)
+    >>> flat.total_under(15), flat.total_under(16)
+    (5, 20)
+    """
+
+    def __init__(self, parents, sizes, is_directory, depths):
+        import numpy as np
+
+        self.parents = parents
+        self.sizes = sizes
+        self.is_directory = is_directory
+        self.depths = depths
+
+        # Group the nodes by depth once, then add each level into its parents
+        # from the deepest up.
+        by_depth = np.argsort(depths, kind="stable")
+        levels = np.searchsorted(depths[by_depth], np.arange(int(depths.max(initial=0)) + 2))
+
+        self.totals = sizes.copy()
+        for depth in range(len(levels) - 2, 0, -1):
+            at_depth = by_depth[levels[depth]:levels[depth + 1]]
+            np.add.at(self.totals, parents[at_depth], self.totals[at_depth])
+
+        has_children = np.bincount(parents[1:], minlength=len(parents)) > 0
+        self.directory_sizes = np.sort(self.totals[is_directory & has_children])
+        self.running_totals = np.cumsum(self.directory_sizes)
+
+    @classmethod
+    def from_tree(cls, root):
+        import numpy as np
+
+        parents, sizes, is_directory, depths = [], [], [], []
+        stack = [(root, -1, 0)]
+
+        while stack:
+            node, parent, depth = stack.pop()
+            index = len(parents)
+
+            parents.append(parent)
+            sizes.append(node.size if node.children is None else 0)
+            is_directory.append(node.children is not None)
+            depths.append(depth)
+
+            if node.children:
+                stack.extend((child, index, depth + 1) for child in reversed(node.children.values()))
+
+        return cls(
+            np.array(parents, dtype=np.int64),
+            np.array(sizes, dtype=np.int64),
+            np.array(is_directory, dtype=bool),
+            np.array(depths, dtype=np.int64),
+        )
+
+    @property
+    def size(self):
+        return int(self.totals[0])
+
+    def smallest_at_least(self, size):
+        i = self.directory_sizes.searchsorted(size, side="left")
+
+        if i < len(self.directory_sizes):
+            return int(self.directory_sizes[i])
+
+    def total_under(self, size):
+        i = self.directory_sizes.searchsorted(size, side="left")
+
+        return int(self.running_totals[i - 1]) if i else 0
+
+
+def flat_part1(flat):
+    return flat.total_under(SMALL_DIRECTORY)
+
+
+def flat_part2(flat):
+    return flat.smallest_at_least(space_to_free(flat.size) + 1)
+
+
 def main():
     with open("input", "r") as f:
         lines = f.readlines()
@@ -97,22 +97,92 @@ def follow(head, tail):
         return parallel_add(tail, vector)
 
 
-def part1(steps):
+class TileBitmap:
+    """
+    A set of cells stored as one bit each, in 64x64 tiles that are only
+    created once something lands in them. A tile is 512 bytes, so a well
+    trodden area costs about a bit per cell instead of a tuple in a set.
+
+    >>> cells = TileBitmap()
+    >>> cells.update([(0, 0), (1, 0), (-1, -70), (0, 0)])
+    >>> len(cells), (1, 0) in cells, (0, 1) in cells
+    (3, True, False)
+    >>> sorted(cells)
+    [(-1, -70), (0, 0), (1, 0)]
+    """
+
+    TILE = 64
+
+    def __init__(self):
+        self._tiles = {}
+        self._count = 0
+
+    def __repr__(self):
+        return f"TileBitmap({len(self)} cells, {len(self._tiles)} tiles)"
+
+    def __len__(self):
+        return self._count
+
+    def _locate(self, cell):
+        tx, ox = divmod(cell[0], self.TILE)
+        ty, oy = divmod(cell[1], self.TILE)
+        bit = ox * self.TILE + oy
+
+        return (tx, ty), bit >> 3, 1 << (bit & 7)
+
+    def add(self, cell):
+        key, byte, mask = self._locate(cell)
+
+        tile = self._tiles.get(key)
+        if tile is None:
+            tile = self._tiles[key] = bytearray(self.TILE * self.TILE // 8)
+
+        if not tile[byte] & mask:
+            tile[byte] |= mask
+            self._count += 1
+
+    def update(self, cells):
+        for cell in cells:
+            self.add(cell)
+
+    def __contains__(self, cell):
+        key, byte, mask = self._locate(cell)
+        tile = self._tiles.get(key)
+
+        return tile is not None and bool(tile[byte] & mask)
+
+    def __iter__(self):
+        for (tx, ty), tile in self._tiles.items():
+            for byte, bits in enumerate(tile):
+                for offset in range(8):
+                    if bits & (1 << offset):
+                        ox, oy = divmod(byte * 8 + offset, self.TILE)
+                        yield (tx * self.TILE + ox, ty * self.TILE + oy)
+
+
+def part1(steps, visited=None):
+    if visited is None:
+        visited = set()
+
     head = (0, 0)
-    tails = [(0, 0)]
+    tail = (0, 0)
+    visited.add(tail)
 
     for step in steps:
         head = parallel_add(head, step)
 
-        if tail := follow(head, tails[-1]):
-            tails.append(tail)
+        if next_position := follow(head, tail):
+            tail = next_position
+            visited.add(tail)
 
-    return len(set(tails))
+    return len(visited)
 
 
-def part2(steps):
+def part2(steps, visited=None):
+    if visited is None:
+        visited = set()
+
     knots = [(0, 0)] * 10
-    tails = []
 
     for step in steps:
         knots[0] = parallel_add(knots[0], step)
@@ -124,20 +194,177 @@ def part2(steps):
                 # If a knot doesn't move none of the following will either
                 break
 
-        tails.append(knots[-1])
+        visited.add(knots[-1])
+
+    return len(visited)
+
+
+def is_straight(knots, vector):
+    """
+    >>> is_straight([(2, 0), (1, 0), (0, 0)], (1, 0))
+    True
+    >>> is_straight([(2, 1), (1, 0), (0, 0)], (1, 0))
+    False
+    """
+    # A straight rope has its tail exactly one rope length behind the head,
+    # which rules out almost every bent rope without walking the knots.
+    (hx, hy), (tx, ty), (dx, dy) = knots[0], knots[-1], vector
+    if hx - tx != dx * (len(knots) - 1) or hy - ty != dy * (len(knots) - 1):
+        return False
+
+    return all(knots[i] == parallel_subtract(knots[i - 1], vector) for i in range(1, len(knots)))
+
+
+def simulate(moves, knots=2, visited=None):
+    """
+    Run a rope of any length through a stream of movements, returning the
+    cells the tail visited. Once the rope is pulled straight behind the head
+    every knot just moves with it, so the rest of the movement is done in
+    one go.
+
+    >>> moves = [Movement.from_string(s) for s in ["R 4", "U 4", "L 3", "D 1", "R 4", "D 1", "L 5", "R 2"]]
+    >>> len(simulate(moves)), len(simulate(moves, knots=10))
+    (13, 1)
+    >>> len(simulate([Movement.from_string("U 1000000")], knots=10))
+    999992
+    """
+    rope = [(0, 0)] * knots
+
+    if visited is None:
+        visited = set()
+    visited.add(rope[-1])
+
+    for move in moves:
+        vector = DIRECTION_VECTOR[move.direction]
+        remaining = move.distance
+        straight = is_straight(rope, vector)
+
+        while remaining and not straight:
+            rope[0] = parallel_add(rope[0], vector)
+            remaining -= 1
+
+            for i in range(1, knots):
+                if next_position := follow(rope[i - 1], rope[i]):
+                    rope[i] = next_position
+                else:
+                    break
+            else:
+                # Only a step that moved the tail can have pulled the rope
+                # straight.
+                visited.add(rope[-1])
+                straight = is_straight(rope, vector)
+
+        if remaining:
+            (tx, ty), (dx, dy) = rope[-1], vector
+            visited.update(zip(
+                range(tx + dx, tx + dx * (remaining + 1), dx) if dx else itertools.repeat(tx),
+                range(ty + dy, ty + dy * (remaining + 1), dy) if dy else itertools.repeat(ty),
+            ))
+
+            rope = [(x + dx * remaining, y + dy * remaining) for x, y in rope]
+
+    return visited
+
+
+def step_blocks(script, size):
+    """
+    Expand a script of movements into unit steps, size steps at a time, so
+    a long script never has to be held as steps all at once. The last block
+    is padded with steps that don't move.
+
+    >>> [block.tolist() for block in step_blocks([Movement.from_string("R 3"), Movement.from_string("U 2")], 2)]
+    [[[1, 0], [1, 0]], [[1, 0], [0, 1]], [[0, 1], [0, 0]]]
+    """
+    import numpy as np
+
+    block, filled = np.zeros((size, 2), dtype=np.int32), 0
+
+    for move in script:
+        vector, remaining = DIRECTION_VECTOR[move.direction], move.distance
+
+        while remaining:
+            n = min(remaining, size - filled)
+            block[filled:filled + n] = vector
+            filled += n
+            remaining -= n
+
+            if filled == size:
+                yield block
+                block, filled = np.zeros((size, 2), dtype=np.int32), 0
+
+    if filled:
+        yield block
+
 
-    return len(set(tails))
+def batch_simulate(scripts, knots, block_size=4096):
+    """
+    Run many ropes at once, one per script of movements, returning how many
+    cells each rope's tail visited. knots is either one knot count for every
+    rope or one per rope. All ropes are held in a single (ropes, knots, 2)
+    array, and every knot follows using the sign of its offset, which is
+    what FOLLOW_VECTORS encodes.
+
+    Steps are fed in and tail positions deduplicated block_size steps at a
+    time, so memory grows with the cells visited rather than the steps taken.
+
+    >>> example = [Movement.from_string(s) for s in ["R 4", "U 4", "L 3", "D 1", "R 4", "D 1", "L 5", "R 2"]]
+    >>> larger = [Movement.from_string(s) for s in ["R 5", "U 8", "L 8", "D 3", "R 17", "D 10", "L 25", "U 20"]]
+    >>> batch_simulate([example, example, larger], [2, 10, 10]).tolist()
+    [13, 1, 36]
+    >>> batch_simulate([example, example, larger], [2, 10, 10], block_size=3).tolist()
+    [13, 1, 36]
+    """
+    import numpy as np
+
+    ropes = len(scripts)
+    knots = np.broadcast_to(np.asarray(knots), (ropes,))
+
+    rope = np.zeros((ropes, int(knots.max(initial=1)), 2), dtype=np.int32)
+    rows = np.arange(ropes)
+    tail = knots - 1
+
+    # Pack each tail position into one int64 so each rope's distinct cells
+    # are a sorted array of keys. Every tail starts on the origin, key 0.
+    def keys(tails):
+        return (tails[..., 0].astype(np.int64) << 32) | (tails[..., 1].astype(np.int64) & 0xFFFFFFFF)
+
+    seen = [np.zeros(1, dtype=np.int64) for _ in range(ropes)]
+
+    feeds = [step_blocks(script, block_size) for script in scripts]
+    steps = np.empty((block_size, ropes, 2), dtype=np.int32)
+    tails = np.empty((block_size, ropes, 2), dtype=np.int32)
+
+    while True:
+        blocks = [next(feed, None) for feed in feeds]
+        if all(block is None for block in blocks):
+            break
+
+        # Ropes whose script has run out are fed steps that don't move.
+        for r, block in enumerate(blocks):
+            steps[:, r] = 0 if block is None else block
+
+        for t in range(block_size):
+            rope[:, 0] += steps[t]
+
+            for i in range(1, rope.shape[1]):
+                offset = rope[:, i - 1] - rope[:, i]
+                moves = np.abs(offset).max(axis=1) > 1
+                rope[:, i] += np.sign(offset) * moves[:, None]
+
+            tails[t] = rope[rows, tail]
+
+        for r, block_keys in enumerate(keys(tails).T):
+            seen[r] = np.union1d(seen[r], block_keys)
+
+    return np.array([len(cells) for cells in seen], dtype=np.int64)
 
 
 def main():
     with open("input") as fh:
-        contents = fh.readlines()
-
-    moves = [Movement.from_string(line.strip()) for line in contents]
-    steps = [s for m in moves for s in m.to_steps()]
+        moves = [Movement.from_string(line.strip()) for line in fh]
 
-    print("Part 1: ", part1(steps))
-    print("Part 2: ", part2(steps))
+    print("Part 1: ", len(simulate(moves)))
+    print("Part 2: ", len(simulate(moves, knots=10)))
 
 
 if __name__ == "__main__":
@@ -1,3 +1,9 @@
+import array
+import bisect
+import itertools
+import sys
+
+
 def cpu(instructions):
     clock = 0
     state = {
@@ -24,32 +30,138 @@ def cpu(instructions):
     return output
 
 
-def part1(instructions):
-    states = cpu(instructions)
+class Trace:
+    """
+    The value of X at every clock, as in cpu(), but stored as runs: X only
+    changes after an addx, so we keep the clock each run starts at and look
+    clocks up with a binary search.
+
+    >>> trace = cpu_trace(["noop", "addx 3", "addx -5"])
+    >>> len(trace), list(trace)
+    (6, [1, 1, 1, 4, 4, -1])
+    >>> trace[4], trace.signal_strength([1, 4])
+    (4, 22)
+    """
+
+    def __init__(self):
+        self.starts = array.array("q", [0])
+        self.values = array.array("q", [1])
+        self.length = 1
+
+    def __repr__(self):
+        return f"Trace({self.length} clocks, {len(self.starts)} runs)"
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, clock):
+        if not 0 <= clock < self.length:
+            raise IndexError(clock)
+
+        return self.values[bisect.bisect_right(self.starts, clock) - 1]
+
+    def __iter__(self):
+        for i, (start, x) in enumerate(zip(self.starts, self.values)):
+            end = self.starts[i + 1] if i + 1 < len(self.starts) else self.length
+            yield from itertools.repeat(x, end - start)
+
+    def runs(self):
+        return zip(self.starts, self.values)
+
+    def tick(self, clocks, x):
+        if x != self.values[-1]:
+            self.starts.append(self.length + clocks - 1)
+            self.values.append(x)
+
+        self.length += clocks
+
+    def signal_strength(self, clocks):
+        return sum(self[n] * (n + 1) for n in clocks)
+
+
+def cpu_trace(instructions):
+    trace = Trace()
+    x = 1
+
+    for instruction in instructions:
+        operator, *operand = instruction.split()
+
+        if operator == "addx":
+            x += int(operand[0])
+            trace.tick(2, x)
+        if operator == "noop":
+            trace.tick(1, x)
+
+    return trace
+
+
+def part1(trace):
+    return trace.signal_strength(range(19, 221, 40))
+
+
+CRT_WIDTH = 40
+
 
-    return sum([states[n]["x"] * (n + 1) for n in range(19, 221, 40)])
+def render(trace, buffer=None, width=CRT_WIDTH):
+    """
+    Draw the CRT for a whole trace into a buffer, one byte per pixel and a
+    newline after every full row, and return a view of just the part
+    written. Rather than checking each pixel, every run of the trace lights
+    up the sprite's columns on each row it covers.
 
+    >>> trace = cpu_trace(["addx 15", "addx -11", "addx 6", "addx -3", "addx 5"])
+    >>> bytes(render(trace, width=5))
+    b'##..#\\n.....\\n.'
+    >>> buffer = bytearray(b"x" * 20)
+    >>> bytes(render(trace, buffer, width=5))
+    b'##..#\\n.....\\n.'
+    """
+    size = len(trace) + len(trace) // width
 
-def part2(instructions):
-    states = cpu(instructions)
+    if buffer is None:
+        buffer = bytearray(size)
 
-    for clock, state in states.items():
-        x = state["x"]
-        if clock % 40 in (x + o for o in [-1, 0, 1]):
-            print("#", end="")
-        else:
-            print(".", end="")
-        if (clock + 1) % 40 == 0:
-            print()
+    buffer[:size] = b"." * size
+    for row in range(width, size, width + 1):
+        buffer[row] = ord("\n")
+
+    ends = list(trace.starts[1:]) + [len(trace)]
+
+    for (start, x), end in zip(trace.runs(), ends):
+        for row_start in range(start - start % width, end, width):
+            left = max(x - 1, 0, start - row_start)
+            right = min(x + 1, width - 1, end - 1 - row_start)
+
+            if left <= right:
+                offset = row_start + row_start // width
+                buffer[offset + left:offset + right + 1] = b"#" * (right - left + 1)
+
+    return memoryview(buffer)[:size]
+
+
+def part2(trace):
+    screen = render(trace)
+    output = getattr(sys.stdout, "buffer", None)
+
+    # Text streams like StringIO don't have a binary buffer underneath.
+    if output is None:
+        sys.stdout.write(bytes(screen).decode())
+        return
+
+    sys.stdout.flush()
+    output.write(screen)
+    output.flush()
 
 
 def main():
     with open("input") as f:
         instructions = f.readlines()
 
-    print("Part 1:", part1(instructions))
+    trace = cpu_trace(instructions)
+
+    print("Part 1:", part1(trace))
     print("Part 2:")
-    part2(instructions)
+    part2(trace)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,11 @@
+import collections
+import concurrent.futures
 import functools
+import itertools
+import math
 import operator
+import os
+import time
 
 
 class Monkey:
@@ -25,9 +31,13 @@ class Monkey:
         self.the_monkey_key = None
 
         self.inspections = 0
-        self.items_seen = set()
+        # Optional Instruments. When unset, turn() is the plain loop.
+        self.instruments = None
 
     def turn(self):
+        if self.instruments is not None:
+            return self.instrumented_turn()
+
         for item in self.items:
             item = self.operation(item) // self.worry_factor
 
@@ -40,18 +50,120 @@ class Monkey:
 
         self.items = []
 
+    def instrumented_turn(self):
+        instruments = self.instruments
+
+        for item in self.items:
+            item = self.operation(item) // self.worry_factor
+
+            self.inspections += 1
+
+            if item % self.test == 0:
+                destination = self.true_destination
+            else:
+                destination = self.false_destination
+
+            instruments.thrown(destination, item)
+            self.monkeys[destination].send(item)
+
+        self.items = []
+
     def send(self, item):
         if self.the_monkey_key:
             item = item % self.the_monkey_key
 
-        self.items_seen.add(item)
         self.items.append(item)
 
 
+def splitmix64(x):
+    x = (x + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+class Instruments:
+    """
+    Statistics about a run that take the same memory however long it goes:
+    items thrown to each monkey, a histogram of worry values by bit length,
+    a HyperLogLog estimate of how many distinct worry values there were, and
+    round timings.
+
+    >>> m = small_monkeys()
+    >>> instruments = Instruments()
+    >>> part1(m, instruments)
+    10605
+    >>> sum(instruments.received.values()) == sum(monkey.inspections for monkey in m.values())
+    True
+    >>> instruments.rounds, len(instruments.histogram)
+    (20, 65)
+    """
+
+    def __init__(self, precision=10):
+        self.received = collections.Counter()
+        self.histogram = [0] * 65
+
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+        self.rounds = 0
+        self.round_total = 0.0
+        self.round_max = 0.0
+
+    def __repr__(self):
+        return f"Instruments({sum(self.received.values())} thrown, ~{self.distinct()} distinct, {self.rounds} rounds)"
+
+    def thrown(self, destination, item):
+        self.received[destination] += 1
+        self.histogram[min(item.bit_length(), 64)] += 1
+
+        h = splitmix64(hash(item) & 0xFFFFFFFFFFFFFFFF)
+        register = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - rest.bit_length() + 1
+
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def round_finished(self, seconds):
+        self.rounds += 1
+        self.round_total += seconds
+        self.round_max = max(self.round_max, seconds)
+
+    def distinct(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is better for small numbers of values.
+            estimate = m * math.log(m / zeros)
+
+        return round(estimate)
+
+
+def play_rounds(monkeys, rounds, instruments=None):
+    for monkey in monkeys.values():
+        monkey.instruments = instruments
+
+    for __ in range(rounds):
+        if instruments is not None:
+            started = time.perf_counter()
+
+        for monkey in monkeys.values():
+            monkey.turn()
+
+        if instruments is not None:
+            instruments.round_finished(time.perf_counter() - started)
+
+
+# Each operation also carries its expression in terms of "old", so that
+# compile_rounds() can inline it.
 def add(x):
     def f(y):
         return x + y
 
+    f.expression = f"old + {x}"
     return f
 
 
@@ -59,6 +171,7 @@ def mul(x):
     def f(y):
         return x * y
 
+    f.expression = f"old * {x}"
     return f
 
 
@@ -66,32 +179,336 @@ def squ(x):
     return x ** 2
 
 
-def part1(monkeys):
-    for __ in range(20):
-        for monkey in monkeys.values():
-            monkey.turn()
+squ.expression = "old * old"
+
+
+def part1(monkeys, instruments=None):
+    play_rounds(monkeys, 20, instruments)
 
     inspections = sorted((monkey.inspections for monkey in monkeys.values()), reverse=True)
 
     return inspections[0] * inspections[1]
 
 
-def part2(monkeys):
+def use_monkey_key(monkeys):
     the_monkey_key = functools.reduce(operator.__mul__, [m.test for m in monkeys.values()])
 
     for m in monkeys.values():
         m.worry_factor = 1
         m.the_monkey_key = the_monkey_key
 
-    for __ in range(10_000):
-        for monkey in monkeys.values():
-            monkey.turn()
+
+def part2(monkeys, instruments=None):
+    use_monkey_key(monkeys)
+    play_rounds(monkeys, 10_000, instruments)
 
     inspections = sorted((monkey.inspections for monkey in monkeys.values()), reverse=True)
 
     return inspections[0] * inspections[1]
 
 
+def turn_order(monkeys):
+    return {key: position for position, key in enumerate(monkeys)}
+
+
+def round_table(monkeys, order):
+    # Each monkey by its position in the turn order, with destinations as
+    # positions too, so walking a round only indexes lists.
+    return [
+        (m.operation, m.worry_factor, m.test, order[m.true_destination], order[m.false_destination], m.the_monkey_key)
+        for m in monkeys.values()
+    ]
+
+
+def walk_rounds(table, position, item, counts, rounds=1):
+    """
+    Follow a single item from the start of a round, at the monkey in the
+    given position, through that many rounds, adding each inspection to
+    counts (one per position). Positions are from turn_order() and table
+    from round_table(). Returns the position and worry the item starts the
+    next round with.
+    """
+    for __ in range(rounds):
+        while True:
+            operation, worry_factor, test, true_position, false_position, the_monkey_key = table[position]
+            item = operation(item) // worry_factor
+            counts[position] += 1
+
+            destination = true_position if item % test == 0 else false_position
+
+            if the_monkey_key:
+                item = item % the_monkey_key
+
+            # Items thrown to a later monkey get inspected again this round.
+            if destination < position:
+                position = destination
+                break
+
+            position = destination
+
+    return position, item
+
+
+def item_round(monkeys, monkey, item):
+    """
+    Follow a single item from the start of a round, at the given monkey, to
+    the start of the next round. Returns where it ends up and which monkeys
+    inspected it on the way.
+    """
+    order = turn_order(monkeys)
+    keys = list(order)
+    counts = [0] * len(order)
+
+    position, item = walk_rounds(round_table(monkeys, order), order[monkey], item, counts)
+
+    # A monkey only ever throws to later monkeys within a round, so each one
+    # inspects the item at most once, and in turn order.
+    return (keys[position], item), [key for key, count in zip(keys, counts) if count]
+
+
+def item_inspections(monkeys, monkey, item, rounds):
+    """
+    Count the inspections of one item over any number of rounds. With the
+    monkey key an item only has so many (monkey, worry) states, so it must
+    eventually repeat one; after that the rounds just go round the cycle.
+    """
+    inspections = collections.Counter()
+    order = turn_order(monkeys)
+    table = round_table(monkeys, order)
+    seen = {}
+    history = []
+    state = (order[monkey], item)
+
+    for r in range(rounds):
+        if state in seen:
+            start = seen[state]
+            full_cycles, extra = divmod(rounds - r, r - start)
+
+            for inspected_by in history[start:]:
+                for m in inspected_by:
+                    inspections[m] += full_cycles
+
+            for inspected_by in history[start:start + extra]:
+                inspections.update(inspected_by)
+
+            break
+
+        seen[state] = r
+        counts = [0] * len(table)
+        state = walk_rounds(table, *state, counts)
+        inspected_by = [position for position, count in enumerate(counts) if count]
+
+        history.append(inspected_by)
+        inspections.update(inspected_by)
+
+    keys = list(order)
+
+    return collections.Counter({keys[position]: count for position, count in inspections.items()})
+
+
+def cycle_inspections(monkeys, rounds):
+    """
+    >>> m = small_monkeys()
+    >>> use_monkey_key(m)
+    >>> [cycle_inspections(m, 20)[k] for k in m]
+    [99, 97, 8, 103]
+    >>> [cycle_inspections(m, 10_000)[k] for k in m]
+    [52166, 47830, 1938, 52013]
+    """
+    inspections = collections.Counter()
+
+    for key, monkey in monkeys.items():
+        for item in monkey.items:
+            inspections.update(item_inspections(monkeys, key, item, rounds))
+
+    return inspections
+
+
+def part2_cycles(monkeys, rounds=10_000):
+    use_monkey_key(monkeys)
+
+    inspections = sorted(cycle_inspections(monkeys, rounds).values(), reverse=True)
+
+    return inspections[0] * inspections[1]
+
+
+def simulate_items(factory, items, rounds):
+    """
+    Simulate some of the items on their own. The monkeys are rebuilt from
+    factory (monkeys or small_monkeys) since their operations are closures,
+    which can't be sent to another process.
+    """
+    monkeys = factory()
+    use_monkey_key(monkeys)
+
+    order = turn_order(monkeys)
+    table = round_table(monkeys, order)
+    counts = [0] * len(order)
+
+    for key, item in items:
+        walk_rounds(table, order[key], item, counts, rounds)
+
+    return collections.Counter(dict(zip(order, counts)))
+
+
+def parallel_inspections(factory, rounds=10_000, workers=None):
+    """
+    With the monkey key in place items never affect each other, so they can
+    be split up between processes and the inspections added up at the end.
+
+    >>> [parallel_inspections(small_monkeys, 20, workers=2)[k] for k in range(4)]
+    [99, 97, 8, 103]
+    """
+    items = [(key, item) for key, monkey in factory().items() for item in monkey.items]
+    workers = workers or os.cpu_count()
+    shards = [items[i::workers] for i in range(workers)]
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        counts = pool.map(simulate_items, itertools.repeat(factory), shards, itertools.repeat(rounds))
+
+        return sum(counts, collections.Counter())
+
+
+def part2_parallel(factory, rounds=10_000, workers=None):
+    inspections = sorted(parallel_inspections(factory, rounds, workers).values(), reverse=True)
+
+    return inspections[0] * inspections[1]
+
+
+INT64_MAX = 2 ** 63 - 1
+
+
+class MonkeyArrays:
+    """
+    The same monkeys, but each one's items are held in a numpy array and a
+    turn deals with all of them at once. The operations from add()/mul()/squ
+    work on arrays as they are. Worry values are int64, which is plenty once
+    they're kept below the monkey key. Without it (part 1) they can grow, so
+    each turn checks its biggest item won't overflow first.
+
+    >>> [simulate_arrays(small_monkeys(), 20)[k] for k in range(4)]
+    [101, 95, 7, 105]
+    >>> m = small_monkeys()
+    >>> use_monkey_key(m)
+    >>> [simulate_arrays(m, 10_000)[k] for k in range(4)]
+    [52166, 47830, 1938, 52013]
+    >>> simulate_arrays(small_monkeys(), 10_000)
+    Traceback (most recent call last):
+    ...
+    OverflowError: monkey 2 would overflow int64 on worry 4610690423
+    """
+
+    def __init__(self, monkeys):
+        import numpy as np
+
+        self.np = np
+        self.monkeys = monkeys
+        self.items = {k: np.array(m.items, dtype=np.int64) for k, m in monkeys.items()}
+        self.inspections = {k: 0 for k in monkeys}
+
+    def turn(self, key):
+        np = self.np
+        m = self.monkeys[key]
+
+        # The operations only ever increase worry, so checking the largest
+        # item (as a Python int) covers them all.
+        if len(self.items[key]):
+            largest = int(self.items[key].max())
+            if m.operation(largest) > INT64_MAX:
+                raise OverflowError(f"monkey {key} would overflow int64 on worry {largest}")
+
+        items = m.operation(self.items[key]) // m.worry_factor
+        self.inspections[key] += len(items)
+
+        divisible = items % m.test == 0
+
+        if m.the_monkey_key:
+            items %= m.the_monkey_key
+
+        for destination, thrown in ((m.true_destination, divisible), (m.false_destination, ~divisible)):
+            self.items[destination] = np.concatenate((self.items[destination], items[thrown]))
+
+        self.items[key] = items[:0]
+
+    def round(self):
+        for key in self.monkeys:
+            self.turn(key)
+
+
+def simulate_arrays(monkeys, rounds):
+    arrays = MonkeyArrays(monkeys)
+
+    for __ in range(rounds):
+        arrays.round()
+
+    return arrays.inspections
+
+
+def compile_rounds(monkeys):
+    """
+    Generate a single function that plays any number of rounds, with every
+    monkey's operation, test and destinations written in as constants and
+    the items in local lists. The worry factor and monkey key are baked in
+    too, so set them up first.
+    """
+    index = {key: i for i, key in enumerate(monkeys)}
+    names = [f"items_{i}" for i in index.values()]
+
+    lines = [
+        "def rounds(count, items):",
+        f"    {', '.join(names)}, = items",
+        *(f"    append_{i} = items_{i}.append" for i in index.values()),
+        *(f"    inspections_{i} = 0" for i in index.values()),
+        "    for __ in range(count):",
+    ]
+
+    for key, i in index.items():
+        m = monkeys[key]
+
+        worry = f"({m.operation.expression})"
+        if m.worry_factor != 1:
+            worry += f" // {m.worry_factor}"
+
+        reduce = f" % {m.the_monkey_key}" if m.the_monkey_key else ""
+
+        lines += [
+            f"        for old in items_{i}:",
+            f"            new = {worry}",
+            f"            if new % {m.test} == 0:",
+            f"                append_{index[m.true_destination]}(new{reduce})",
+            "            else:",
+            f"                append_{index[m.false_destination]}(new{reduce})",
+            f"        inspections_{i} += len(items_{i})",
+            f"        items_{i}.clear()",
+        ]
+
+    lines.append(f"    return [{', '.join(f'inspections_{i}' for i in index.values())}]")
+
+    namespace = {}
+    exec(compile("\n".join(lines), "<monkey rounds>", "exec"), namespace)
+
+    return namespace["rounds"]
+
+
+def compiled_inspections(monkeys, rounds):
+    """
+    >>> compiled_inspections(small_monkeys(), 20)
+    [101, 95, 7, 105]
+    >>> m = small_monkeys()
+    >>> use_monkey_key(m)
+    >>> compiled_inspections(m, 10_000)
+    [52166, 47830, 1938, 52013]
+    """
+    items = [list(monkey.items) for monkey in monkeys.values()]
+    inspections = compile_rounds(monkeys)(rounds, items)
+
+    for monkey, monkey_items, count in zip(monkeys.values(), items, inspections):
+        monkey.items = monkey_items
+        monkey.inspections += count
+
+    return inspections
+
+
 def monkeys():
     m = {}
 
@@ -1,4 +1,8 @@
+import array
 import collections
+import hashlib
+import heapq
+import itertools
 
 
 ADJACENT = [(0, 1), (0, -1), (1, 0), (-1, 0)]
@@ -8,24 +12,90 @@ PATH_MARKER = {
     (1, 0): "↓",
     (-1, 0): "↑",
 }
+SEARCH_STRATEGIES = {
+    "bfs": "bfs_path",
+    "astar": "astar_path",
+    "bidirectional": "bidirectional_path",
+}
+
 
 class Maze:
     def __init__(self, cells, start, end):
-        self.cells = cells
         self.start = start
         self.end = end
 
+        # Heights are kept flat, one byte per cell at x * h + y. This is the
+        # only copy of the terrain; change it with set_cell().
+        self.w, self.h = len(cells), len(cells[0])
+        self.heights = bytearray(itertools.chain.from_iterable(cells))
+
+        # Flat offsets for ADJACENT, in the same order.
+        self.offsets = [dx * self.h + dy for dx, dy in ADJACENT]
+
+        # Distance fields by (content hash, end), least recently used first.
+        self.fields = collections.OrderedDict()
+        self.max_fields = 8
+        self._content_hash = None
+
     def __repr__(self):
         return f"Maze({self.size()}, start={self.start}, end={self.end})"
 
+    @property
+    def cells(self):
+        # A read-only snapshot of the rows.
+        return tuple(tuple(self.heights[x * self.h:(x + 1) * self.h]) for x in range(self.w))
+
     def size(self):
-        return len(self.cells), len(self.cells[0])
+        return self.w, self.h
 
-    def cell(self, x, y):
-        w, h = self.size()
+    def index(self, x, y):
+        # None for anything off the maze, the same as cell().
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return x * self.h + y
+
+    def position(self, index):
+        return divmod(index, self.h)
 
-        if 0 <= x < w and 0 <= y < h:
-            return self.cells[x][y]
+    def cell(self, x, y):
+        if 0 <= x < self.w and 0 <= y < self.h:
+            return self.heights[x * self.h + y]
+
+    def content_hash(self):
+        """
+        A hash of the terrain, taken once over all the heights and then
+        updated per cell by set_cell(). Each edit XORs out the cell's old
+        value and XORs in the new one, so the same terrain always gets the
+        same hash however it was reached.
+        """
+        if self._content_hash is None:
+            digest = hashlib.blake2b(self.heights, digest_size=8).digest()
+            self._content_hash = int.from_bytes(digest, "little")
+
+        return self._content_hash
+
+    def set_cell(self, x, y, height):
+        """
+        Change a cell's height, repairing any cached distance fields for the
+        current terrain rather than throwing them away.
+        """
+        index = self.index(x, y)
+
+        if index is None:
+            raise IndexError(f"({x}, {y}) is off the maze")
+
+        if not 0 <= height < 256:
+            raise ValueError(f"height {height} doesn't fit in a byte")
+
+        old_hash = self.content_hash()
+        new_hash = old_hash ^ hash((index, self.heights[index])) ^ hash((index, height))
+
+        self.heights[index] = height
+        self._content_hash = new_hash
+
+        for key in [key for key in self.fields if key[0] == old_hash]:
+            field = self.fields.pop(key)
+            field.repair(index)
+            self._remember(key[1], field)
 
     def options(self, x, y):
         height = self.cell(x, y)
@@ -36,27 +106,288 @@ class Maze:
             if cell is not None and cell <= height + 1:
                 yield (x + dx, y + dy)
 
-    def shortest_path(self, start, end):
-        distances = {start: []}
+    def neighbours(self, index, reverse=False):
+        """
+        The flat indexes we can step to from index, or in reverse the ones we
+        could have stepped from.
+        """
+        heights, h = self.heights, self.h
+        height = heights[index]
+        y = index % h
+        right, left, down, up = self.offsets
+
+        for offset, inside in (
+            (right, y < h - 1),
+            (left, y > 0),
+            (down, index + down < len(heights)),
+            (up, index + up >= 0),
+        ):
+            if not inside:
+                continue
+
+            option = index + offset
+
+            if reverse:
+                if height <= heights[option] + 1:
+                    yield option
+            elif heights[option] <= height + 1:
+                yield option
+
+    def search(self, start, goal=None, reverse=False):
+        """
+        Breadth-first search over flat indexes from start, stopping early if
+        we find goal. Going in reverse follows the steps backwards, i.e. down
+        at most one at a time.
+
+        Returns the previous cell and distance of every cell, both -1 for
+        cells that weren't reached, and how many cells were expanded.
+        """
+        previous = array.array("i", [-1]) * len(self.heights)
+        distances = array.array("i", [-1]) * len(self.heights)
+        previous[start] = start
+        distances[start] = 0
+        expanded = 0
+
         queue = collections.deque([start])
 
         while queue:
             current = queue.popleft()
-            for option in self.options(*current):
-                if option == end:
-                    return distances[current] + [option]
+            expanded += 1
 
-                if option in distances:
+            for option in self.neighbours(current, reverse):
+                if previous[option] != -1:
                     continue
 
                 # We don't need to check lengths because we're doing a
                 # breadth-first search, so every distance will be the shortest.
-                distances[option] = distances[current] + [option]
+                previous[option] = current
+                distances[option] = distances[current] + 1
+
+                if option == goal:
+                    return previous, distances, expanded
 
                 queue.append(option)
 
+        return previous, distances, expanded
+
+    def path(self, previous, start, end):
+        # Every step after start, up to and including end.
+        path = []
+        current = end
+
+        while current != start:
+            path.append(self.position(current))
+            current = previous[current]
+
+        path.reverse()
+        return path
+
+    def shortest_distance(self, start, end):
+        start, end = self.index(*start), self.index(*end)
+
+        if start is None or end is None:
+            return None
+
+        __, distances, __ = self.search(start, end)
+
+        if distances[end] != -1:
+            return distances[end]
+
+    def shortest_path(self, start, end):
+        start, end = self.index(*start), self.index(*end)
+
+        if start is None or end is None:
+            return None
+
+        previous, __, __ = self.search(start, end)
+
+        if previous[end] != -1:
+            return self.path(previous, start, end)
+
         return None
 
+    def bfs_path(self, start, end):
+        start, end = self.index(*start), self.index(*end)
+
+        if start is None or end is None:
+            return None, 0
+
+        previous, __, expanded = self.search(start, end)
+
+        if previous[end] != -1:
+            return self.path(previous, start, end), expanded
+
+        return None, expanded
+
+    def astar_path(self, start, end):
+        """
+        A* search. Every step moves one cell and climbs at most one, so both
+        the Manhattan distance and the height still to climb are lower bounds
+        on the steps left; we use whichever is bigger.
+        """
+        start, end = self.index(*start), self.index(*end)
+
+        if start is None or end is None:
+            return None, 0
+
+        (ex, ey), target = self.position(end), self.heights[end]
+
+        def estimate(index):
+            x, y = self.position(index)
+            return max(abs(ex - x) + abs(ey - y), target - self.heights[index])
+
+        previous = array.array("i", [-1]) * len(self.heights)
+        costs = array.array("i", [-1]) * len(self.heights)
+        closed = bytearray(len(self.heights))
+        previous[start] = start
+        costs[start] = 0
+        expanded = 0
+
+        heap = [(estimate(start), start)]
+
+        while heap:
+            __, current = heapq.heappop(heap)
+
+            if closed[current]:
+                continue
+
+            closed[current] = 1
+            expanded += 1
+
+            if current == end:
+                return self.path(previous, start, end), expanded
+
+            cost = costs[current] + 1
+
+            for option in self.neighbours(current):
+                if closed[option] or costs[option] != -1 and costs[option] <= cost:
+                    continue
+
+                previous[option] = current
+                costs[option] = cost
+
+                heapq.heappush(heap, (cost + estimate(option), option))
+
+        return None, expanded
+
+    def bidirectional_path(self, start, end):
+        """
+        Breadth-first search from both ends at once, backwards from end, one
+        whole level at a time from whichever side has the smaller frontier.
+        The first level where they meet holds the shortest path.
+        """
+        start, end = self.index(*start), self.index(*end)
+
+        if start is None or end is None:
+            return None, 0
+
+        if start == end:
+            return [], 0
+
+        previous = array.array("i", [-1]) * len(self.heights)
+        next_step = array.array("i", [-1]) * len(self.heights)
+        forward_distances = array.array("i", [-1]) * len(self.heights)
+        backward_distances = array.array("i", [-1]) * len(self.heights)
+        previous[start] = start
+        next_step[end] = end
+        forward_distances[start] = 0
+        backward_distances[end] = 0
+        expanded = 0
+
+        forward, backward = [start], [end]
+
+        while forward and backward:
+            reverse = len(backward) < len(forward)
+
+            if reverse:
+                frontier, links, distances, others = backward, next_step, backward_distances, forward_distances
+            else:
+                frontier, links, distances, others = forward, previous, forward_distances, backward_distances
+
+            meeting = None
+            following = []
+
+            for current in frontier:
+                expanded += 1
+
+                for option in self.neighbours(current, reverse):
+                    if links[option] != -1:
+                        continue
+
+                    links[option] = current
+                    distances[option] = distances[current] + 1
+                    following.append(option)
+
+                    if others[option] != -1:
+                        total = distances[option] + others[option]
+
+                        if meeting is None or total < forward_distances[meeting] + backward_distances[meeting]:
+                            meeting = option
+
+            if meeting is not None:
+                path = self.path(previous, start, meeting)
+
+                while meeting != end:
+                    meeting = next_step[meeting]
+                    path.append(self.position(meeting))
+
+                return path, expanded
+
+            if reverse:
+                backward = following
+            else:
+                forward = following
+
+        return None, expanded
+
+    def find_path(self, start, end, strategy="bfs"):
+        """
+        The shortest path from start to end using one of SEARCH_STRATEGIES,
+        along with the number of cells that strategy expanded.
+        """
+        return getattr(self, SEARCH_STRATEGIES[strategy])(start, end)
+
+    def _remember(self, end, field):
+        key = (self.content_hash(), end)
+
+        self.fields[key] = field
+        self.fields.move_to_end(key)
+
+        while len(self.fields) > self.max_fields:
+            self.fields.popitem(last=False)
+
+    def distance_field(self, end=None):
+        end = self.end if end is None else end
+        key = (self.content_hash(), end)
+
+        if key in self.fields:
+            self.fields.move_to_end(key)
+            return self.fields[key]
+
+        field = DistanceField(self, end)
+        self._remember(end, field)
+
+        return field
+
+    def distance_to(self, start, end=None):
+        return self.distance_field(end).distance(start)
+
+    def path_to(self, start, end=None):
+        return self.distance_field(end).path(start)
+
+    def shortest_from_height(self, height=0):
+        field = self.distance_field()
+        end = self.index(*self.end)
+
+        best = None
+        for i, cell in enumerate(self.heights):
+            if cell == height and i != end and field.distances[i] != -1:
+                if best is None or field.distances[i] < field.distances[best]:
+                    best = i
+
+        if best is not None:
+            return field.path(self.position(best))
+
     def from_any_start(self):
         # I have a cold. Please don't judge me.
         w, h = self.size()
@@ -76,7 +407,7 @@ class Maze:
         for x in range(w):
             m.append([])
             for y in range(h):
-                m[-1].append(chr(self.cells[x][y] + 97))
+                m[-1].append(chr(self.cell(x, y) + 97))
 
         if path:
             for i in range(1, len(path)):
@@ -91,6 +422,115 @@ class Maze:
             print("".join(row))
 
 
+class DistanceField:
+    """
+    Distances to end from every cell that can get there, found with a single
+    breadth-first search backwards from end. Each cell also remembers its
+    next step, so paths are only built when asked for.
+    """
+
+    def __init__(self, maze, end):
+        self.maze = maze
+        self.end = end
+
+        if maze.index(*end) is None:
+            # Nothing can get to an end that's off the maze.
+            self.next_step = array.array("i", [-1]) * len(maze.heights)
+            self.distances = array.array("i", [-1]) * len(maze.heights)
+        else:
+            self.next_step, self.distances, __ = maze.search(maze.index(*end), reverse=True)
+
+    def __repr__(self):
+        return f"DistanceField(end={self.end})"
+
+    def distance(self, start):
+        start = self.maze.index(*start)
+
+        if start is not None and self.distances[start] != -1:
+            return self.distances[start]
+
+    def path(self, start):
+        # The same shape as Maze.shortest_path: every step after start.
+        start = self.maze.index(*start)
+
+        if start is None or self.distances[start] == -1:
+            return None
+
+        path = []
+        end = self.maze.index(*self.end)
+
+        while start != end:
+            start = self.next_step[start]
+            path.append(self.maze.position(start))
+
+        return path
+
+    def repair(self, changed):
+        """
+        Fix the field after the height of one cell has changed. Only steps
+        into or out of that cell can have appeared or gone:
+
+        * Anything whose route to end used a step that's gone loses its
+          distance, along with everything routed through it.
+        * Those cells, and any cell next to the change that may have a new
+          shortcut, are then settled again in distance order, starting from
+          the distances that are still good.
+        """
+        maze, distances, next_step = self.maze, self.distances, self.next_step
+        end = maze.index(*self.end)
+        around = [changed] + self._grid_neighbours(changed)
+
+        lost = set()
+        broken = [
+            i for i in around
+            if i != end and next_step[i] != -1 and next_step[i] not in maze.neighbours(i)
+        ]
+
+        while broken:
+            i = broken.pop()
+            if i in lost:
+                continue
+
+            lost.add(i)
+            broken.extend(j for j in self._grid_neighbours(i) if next_step[j] == i and j not in lost)
+
+        for i in lost:
+            distances[i] = -1
+            next_step[i] = -1
+
+        heap = []
+
+        for i in itertools.chain(lost, around):
+            if i == end:
+                continue
+
+            for j in maze.neighbours(i):
+                if distances[j] != -1 and (distances[i] == -1 or distances[j] + 1 < distances[i]):
+                    distances[i] = distances[j] + 1
+                    next_step[i] = j
+
+            if distances[i] != -1:
+                heapq.heappush(heap, (distances[i], i))
+
+        while heap:
+            distance, current = heapq.heappop(heap)
+
+            if distance != distances[current]:
+                continue
+
+            for option in maze.neighbours(current, reverse=True):
+                if distances[option] == -1 or distance + 1 < distances[option]:
+                    distances[option] = distance + 1
+                    next_step[option] = current
+                    heapq.heappush(heap, (distance + 1, option))
+
+    def _grid_neighbours(self, index):
+        x, y = self.maze.position(index)
+        w, h = self.maze.size()
+
+        return [self.maze.index(x + dx, y + dy) for dx, dy in ADJACENT if 0 <= x + dx < w and 0 <= y + dy < h]
+
+
 def parse_maze(maze_rows):
     maze = []
     start = None
@@ -116,12 +556,11 @@ def parse_maze(maze_rows):
 
 
 def part1(maze):
-    path = list(maze.shortest_path(maze.start, maze.end))
-    return len(list(path))
+    return maze.shortest_distance(maze.start, maze.end)
 
 
 def part2(maze):
-    return min(len(shortest_path) for shortest_path in maze.from_any_start())
+    return len(maze.shortest_from_height(0))
 
 
 def main():
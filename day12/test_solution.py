@@ -23,6 +23,19 @@ def test_cell(small_maze):
     assert small_maze.cell(-3, 2) is None
 
 
+@pytest.mark.parametrize("strategy", ["bfs", "astar", "bidirectional"])
+def test_off_the_maze(strategy):
+    maze = Maze([[0, 1, 2], [5, 4, 3]], (0, 0), (1, 0))
+
+    assert maze.index(0, 5) is None
+    assert maze.shortest_path((0, 0), (0, 5)) is None
+    assert maze.shortest_distance((0, 0), (0, 5)) is None
+    assert maze.shortest_path((-1, 0), (0, 2)) is None
+    assert maze.find_path((0, 0), (0, 5), strategy) == (None, 0)
+    assert maze.distance_to((0, 0), (0, 5)) is None
+    assert maze.path_to((2, 0)) is None
+
+
 def test_options(small_maze):
     assert list(small_maze.options(0, 0)) == [(0, 1)]
     assert list(small_maze.options(0, 1)) == [(0, 0), (1, 1)]
@@ -38,3 +51,112 @@ def test_shortest_path(small_maze):
         (1, 2),
         (0, 2),
     ]
+
+
+def test_shortest_distance(small_maze):
+    assert small_maze.shortest_distance(small_maze.start, small_maze.end) == 6
+    assert small_maze.shortest_distance((0, 2), (0, 0)) == 2
+    assert small_maze.shortest_distance((2, 0), (0, 2)) == 4
+
+
+def test_distance_field(small_maze):
+    field = small_maze.distance_field()
+
+    assert field.distance(small_maze.end) == 0
+    assert field.distance((0, 0)) == 6
+    assert field.distance((2, 0)) == 4
+    assert field.path((0, 0)) == small_maze.shortest_path((0, 0), small_maze.end)
+
+
+def test_shortest_from_height(small_maze):
+    shortest = min(small_maze.from_any_start(), key=len)
+
+    assert small_maze.shortest_from_height(0) == shortest
+    assert small_maze.shortest_from_height(3) == [(2, 2), (1, 2), (0, 2)]
+    assert small_maze.shortest_from_height(9) is None
+
+
+@pytest.mark.parametrize("strategy", ["bfs", "astar", "bidirectional"])
+def test_find_path(small_maze, strategy):
+    path, expanded = small_maze.find_path(small_maze.start, small_maze.end, strategy)
+
+    assert len(path) == 6
+    assert path[-1] == small_maze.end
+    assert 0 < expanded <= 9
+
+
+@pytest.mark.parametrize("strategy", ["bfs", "astar", "bidirectional"])
+def test_find_path_unreachable(strategy):
+    maze = Maze([[0, 5, 0]], (0, 0), (0, 2))
+
+    assert maze.find_path(maze.start, maze.end, strategy)[0] is None
+
+
+def test_distance_field_cache(small_maze):
+    field = small_maze.distance_field()
+
+    assert small_maze.distance_field() is field
+    assert small_maze.distance_to((0, 0)) == 6
+    assert small_maze.path_to((0, 0)) == field.path((0, 0))
+
+    small_maze.max_fields = 2
+    small_maze.distance_field((0, 0))
+    small_maze.distance_field((1, 1))
+
+    assert small_maze.distance_field() is not field
+
+
+def test_set_cell_repairs_fields(small_maze):
+    field = small_maze.distance_field()
+
+    small_maze.set_cell(0, 1, 5)
+    assert small_maze.distance_field() is field
+
+    fresh = Maze([row[:] for row in small_maze.cells], small_maze.start, small_maze.end).distance_field()
+    assert list(field.distances) == list(fresh.distances)
+    assert small_maze.distance_to((0, 0)) is None
+
+    small_maze.set_cell(0, 1, 1)
+    assert small_maze.distance_to((0, 0)) == 6
+
+
+def test_cells_follow_set_cell(small_maze):
+    with pytest.raises(TypeError):
+        small_maze.cells[0][1] = 9
+
+    small_maze.set_cell(0, 1, 9)
+
+    assert small_maze.cells[0] == (0, 9, 6)
+    assert small_maze.cell(0, 1) == 9
+    assert small_maze.shortest_distance(small_maze.start, small_maze.end) is None
+
+
+def test_content_hash_follows_edits(small_maze):
+    original = small_maze.content_hash()
+
+    small_maze.set_cell(0, 1, 5)
+    small_maze.set_cell(2, 2, 1)
+    assert small_maze.content_hash() != original
+
+    small_maze.set_cell(2, 2, 4)
+    small_maze.set_cell(0, 1, 1)
+    assert small_maze.content_hash() == original
+
+
+@pytest.mark.parametrize("x, y, height, error", [
+    (0, 3, 9, IndexError),
+    (-1, 0, 7, IndexError),
+    (0, 0, 256, ValueError),
+    (0, 0, -1, ValueError),
+])
+def test_set_cell_rejects_bad_edits(x, y, height, error):
+    maze = Maze([[0, 1, 2], [5, 4, 3]], (0, 0), (1, 0))
+    field = maze.distance_field()
+    original = maze.content_hash()
+
+    with pytest.raises(error):
+        maze.set_cell(x, y, height)
+
+    assert maze.cells == ((0, 1, 2), (5, 4, 3))
+    assert maze.content_hash() == original
+    assert maze.distance_field() is field
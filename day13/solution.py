@@ -1,3 +1,5 @@
+import bisect
+import collections
 import functools
 import itertools
 import json
@@ -79,22 +81,303 @@ def qsort(seq):
     return qsort(left) + [pivot] + qsort(right)
 
 
+# Leaf tags for packet_key: an empty list is smaller than any int.
+EMPTY = 0
+INT = 1
+
+
+def packet_key(packet):
+    """
+    A flat tuple that sorts the same way as the packets do.
+
+    It's a record for every leaf (an int or an empty list), followed by the
+    depth it drops back to before the next leaf. An int compares the same
+    however deeply it's wrapped (5 is the same as [[5]]), so ints are just
+    their value. An empty list isn't, so it records its depth. After equal
+    leaves, whichever packet closes more lists first is the smaller.
+
+    Unlike compare(), equal sublists don't decide anything on their own.
+
+    >>> packet_key([[1], 4])
+    (1, 1, 1, 1, 4, 0)
+    >>> packet_key([1, [2, [3, [4, [5, 6, 7]]]], 8, 9]) > packet_key([1, [2, [3, [4, [5, 6, 0]]]], 8, 9])
+    True
+    >>> packet_key([[1], [2, 3, 4]]) < packet_key([[1], 4])
+    True
+    >>> packet_key([[[]]]) > packet_key([[]]) > packet_key([])
+    True
+    >>> packet_key([[1, 2], 3]) > packet_key([1, 2, 3])
+    True
+    >>> packet_key([[4]]) == packet_key([4])
+    True
+    """
+    key = []
+    lowest = 0
+
+    def leaf(tag, value):
+        if key:
+            key.append(lowest)
+        key.extend((tag, value))
+
+    def visit(packet, depth):
+        nonlocal lowest
+
+        if not packet:
+            leaf(EMPTY, depth)
+            lowest = depth
+
+        for item in packet:
+            if type(item) == int:
+                leaf(INT, item)
+                lowest = depth
+            else:
+                visit(item, depth + 1)
+
+        lowest = min(lowest, depth - 1)
+
+    visit(packet, 1)
+    key.append(lowest)
+
+    return tuple(key)
+
+
 def part1(pairs):
     for i, (left, right) in enumerate(pairs):
         if compare(left, right) == True:
             yield i + 1
 
 
-def part2(pairs):
-    dividers = [[[2]], [[6]]]
+DIVIDERS = [[[2]], [[6]]]
+
 
-    packets = qsort(list(itertools.chain(itertools.chain(*pairs), dividers)))
+def sorted_positions(packets, dividers):
+    # Packets go in first so the stable sort puts any packet equal to a
+    # divider before it. Dividers are picked out by identity, not equality,
+    # so those packets aren't mistaken for them.
+    packets = sorted(itertools.chain(packets, dividers), key=packet_key)
 
     for i, packet in enumerate(packets):
-        if packet in dividers:
+        if any(packet is divider for divider in dividers):
             yield (i + 1)
 
 
+def divider_ranks(packets, dividers):
+    """
+    Where each divider would end up (counting from 1) if the packets and
+    dividers were sorted, without sorting them. Each packet is looked up once
+    in the sorted dividers to find which ones it goes before. Like
+    sorted_positions, a packet equal to a divider goes before it.
+
+    >>> packets = [[1, 1, 3, 1, 1], [[1], 4], [9], [[8, 7, 6]], [], [3], [[[]]], [7, 7, 7]]
+    >>> divider_ranks(packets, [[[6]], [[2]]])
+    [7, 5]
+    >>> list(sorted_positions(packets, [[[6]], [[2]]]))
+    [5, 7]
+    >>> divider_ranks([[[2]], [2]], DIVIDERS), list(sorted_positions([[[2]], [2]], DIVIDERS))
+    ([3, 4], [3, 4])
+    """
+    order = sorted(range(len(dividers)), key=lambda i: packet_key(dividers[i]))
+    keys = [packet_key(dividers[i]) for i in order]
+
+    # How many packets sort after exactly this many dividers.
+    after = [0] * (len(dividers) + 1)
+    for packet in packets:
+        after[bisect.bisect_left(keys, packet_key(packet))] += 1
+
+    ranks = [0] * len(dividers)
+    smaller = 0
+
+    for position, i in enumerate(order):
+        smaller += after[position]
+        ranks[i] = smaller + position + 1
+
+    return ranks
+
+
+def part2(pairs):
+    return divider_ranks(itertools.chain(*pairs), DIVIDERS)
+
+
+OPEN = "["
+CLOSE = "]"
+
+
+def tokenize(data):
+    """
+    Lazily read the tokens of a packet from bytes (or a memoryview): OPEN,
+    CLOSE or an int.
+
+    >>> list(tokenize(b"[1,[22,[]]]"))
+    ['[', 1, '[', 22, '[', ']', ']', ']']
+    """
+    data = memoryview(data)
+    i, n = 0, len(data)
+
+    while i < n:
+        c = data[i]
+
+        if c == ord("["):
+            yield OPEN
+            i += 1
+        elif c == ord("]"):
+            yield CLOSE
+            i += 1
+        elif ord("0") <= c <= ord("9"):
+            value = 0
+            while i < n and ord("0") <= data[i] <= ord("9"):
+                value = value * 10 + data[i] - ord("0")
+                i += 1
+            yield value
+        else:
+            i += 1
+
+
+def compare_tokens(left, right):
+    """
+    Compare two token streams, reading only as far as the first token that
+    decides it. An int meeting a list is wrapped as if it were one, by
+    pushing the int and a CLOSE back onto its side. Returns True if left
+    comes first, False if right does, and None if they're the same.
+
+    >>> compare_tokens(tokenize(b"[[1],[2,3,4]]"), tokenize(b"[[1],4]"))
+    True
+    >>> compare_tokens(tokenize(b"[9]"), tokenize(b"[[8,7,6]]"))
+    False
+    >>> compare_tokens(tokenize(b"[[[]]]"), tokenize(b"[[]]"))
+    False
+    >>> compare_tokens(tokenize(b"[[4]]"), tokenize(b"[4]"))
+    >>> compare_tokens(tokenize(b"[1,[2,[3,[4,[5,6,7]]]],8,9]"), tokenize(b"[1,[2,[3,[4,[5,6,0]]]],8,9]"))
+    False
+    """
+    left_pending, right_pending = [], []
+
+    while True:
+        a = left_pending.pop() if left_pending else next(left, None)
+        b = right_pending.pop() if right_pending else next(right, None)
+
+        if a == b:
+            if a is None:
+                return None
+            continue
+
+        if a is CLOSE or a is None:
+            return True
+        if b is CLOSE or b is None:
+            return False
+
+        if a is OPEN:
+            right_pending.extend((CLOSE, b))
+        elif b is OPEN:
+            left_pending.extend((CLOSE, a))
+        else:
+            return a < b
+
+
+def stream_part1(lines):
+    """
+    Part 1 straight from the lines of the input as bytes, e.g. a file opened
+    in binary mode, without building any packets.
+    """
+    lines = (line for line in lines if line.strip())
+
+    for i, (left, right) in enumerate(zip(lines, lines)):
+        if compare_tokens(tokenize(left), tokenize(right)) == True:
+            yield i + 1
+
+
+class PacketTable:
+    """
+    Hash-consed packets: every distinct int or list gets one id, with lists
+    stored as tuples of their items' ids, so repeated sublists are only held
+    once. Comparisons between ids are remembered, up to max_comparisons.
+
+    >>> table = PacketTable()
+    >>> a, b = table.intern([[1], [2, 3, 4]]), table.intern([[1], 4])
+    >>> table.intern([[1], [2, 3, 4]]) == a, table.compare(a, b), table.compare(b, a)
+    (True, -1, 1)
+    >>> list(table.comparisons)
+    [(5, 4), (6, 7), (4, 5), (7, 6)]
+    >>> table.nodes
+    [1, (0,), 2, 3, 4, (2, 3, 4), (1, 5), (1, 4)]
+    >>> [table.packet(i) for i in sorted_interned([b, a], table)]
+    [[[1], [2, 3, 4]], [[1], 4]]
+    """
+
+    def __init__(self, max_comparisons=1 << 16):
+        self.nodes = []
+        self.ids = {}
+        self.comparisons = collections.OrderedDict()
+        self.max_comparisons = max_comparisons
+
+    def __repr__(self):
+        return f"PacketTable({len(self.nodes)} nodes, {len(self.comparisons)} comparisons)"
+
+    def intern(self, packet):
+        if type(packet) == list:
+            packet = tuple(self.intern(item) for item in packet)
+
+        # Ints and tuples never compare equal, so they can share the index.
+        if packet not in self.ids:
+            self.ids[packet] = len(self.nodes)
+            self.nodes.append(packet)
+
+        return self.ids[packet]
+
+    def packet(self, node):
+        value = self.nodes[node]
+
+        if type(value) == int:
+            return value
+
+        return [self.packet(item) for item in value]
+
+    def compare(self, a, b):
+        """
+        -1, 0 or 1 as the packet with id a is before, the same as or after
+        the one with id b.
+        """
+        if a == b:
+            return 0
+
+        left, right = self.nodes[a], self.nodes[b]
+
+        # Two ints are quicker to compare again than to look up, so they're
+        # left out of the memo.
+        if type(left) == int and type(right) == int:
+            return (left > right) - (left < right)
+
+        if (a, b) in self.comparisons:
+            self.comparisons.move_to_end((a, b))
+            return self.comparisons[(a, b)]
+
+        if type(left) == int:
+            left = (a,)
+        if type(right) == int:
+            right = (b,)
+
+        for x, y in zip(left, right):
+            if result := self.compare(x, y):
+                break
+        else:
+            result = (len(left) > len(right)) - (len(left) < len(right))
+
+        self.comparisons[(a, b)] = result
+        if len(self.comparisons) > self.max_comparisons:
+            self.comparisons.popitem(last=False)
+
+        return result
+
+
+def part1_interned(pairs, table):
+    for i, (left, right) in enumerate(pairs):
+        if table.compare(table.intern(left), table.intern(right)) < 0:
+            yield i + 1
+
+
+def sorted_interned(nodes, table):
+    return sorted(nodes, key=functools.cmp_to_key(table.compare))
+
+
 def parse_line(line):
     # Lazy parsing :D
     return json.loads(line)